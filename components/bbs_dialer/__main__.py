@@ -1,15 +1,19 @@
 import os
+import json
+import sqlite3
+import stat
 import sys
-import subprocess
 import uuid
-from dataclasses import dataclass, fields, asdict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
+from dataclasses import dataclass, fields
 from pathlib import Path
-from typing import Dict, List, Optional
-from urllib.parse import urlparse
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
 
-import dialog
 import yaml
 
+# dialog and subprocess are imported where used, not on module import
+
 
 APP_NAME = 'bbs-dialer'
 
@@ -17,22 +21,39 @@ DEFAULT_CONFIG_FILE = Path.home() / '.config' / APP_NAME / 'config.yaml'
 
 DEFAULT_BBS_ENTRY_DIR_PATH = Path.home() / '.config' / APP_NAME / 'bbs_sources'
 DEFAULT_LOCAL_BBS_ENTRY_DIR_PATH = DEFAULT_BBS_ENTRY_DIR_PATH / 'local'
-DEFAULT_BBS_CACHE_FILE = Path.home() / '.cache' / APP_NAME / 'bbs_db.yaml'
+DEFAULT_BBS_CACHE_FILE = Path.home() / '.cache' / APP_NAME / 'bbs_db.sqlite'
 
 DEFAULT_BBS_NAME = "Default BBS"
 DEFAULT_BBS_URL = "telnet://default.example.com"
 DEFAULT_BBS_DESC = "Default Entry"
 DEFAULT_BBS_SOURCE_PATH_TEMPLATE = '{id}.yaml'
 
+# prefer the libyaml C backend when pyyaml was built with it
+_Loader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+_Dumper = getattr(yaml, 'CSafeDumper', yaml.SafeDumper)
+
+# fewer write() syscalls than the default buffer
+_WRITE_BUFFER_SIZE = 1 << 17
+
+# entry files are tiny, so usually a single read()
+_READ_SIZE = 1 << 16
+
 
 @dataclass
 class BBSEntry:
+    # no dataclass(slots=True) before python 3.10
+    __slots__ = ('id', 'name', 'url', 'description', 'source_path', '_argv')
+
     id: str
     name: str
     url: str
     description: str
     source_path: Path
 
+    def __post_init__(self):
+        # launch argv, built lazily; reset when url changes
+        self._argv: Optional[List[str]] = None
+
     @classmethod
     def new(cls, dir_path: Path) -> 'BBSEntry':
         id = str(uuid.uuid4())
@@ -58,11 +79,24 @@ class BBSEntry:
         return BBSEntry(**cleaned_pairs)
 
     def serialize(self) -> Dict[str, str]:
-        return { k : str(v) for k, v in asdict(self).items() }
+        # entries are flat, so skip asdict()'s recursive deep copy
+        return {
+            'id': str(self.id),
+            'name': str(self.name),
+            'url': str(self.url),
+            'description': str(self.description),
+            'source_path': str(self.source_path),
+        }
+
+
+_BBS_FIELDS = fields(BBSEntry)
+_BBS_FIELD_BY_NAME = { field.name : field for field in _BBS_FIELDS }
 
 
 @dataclass
 class AppConfig:
+    __slots__ = ('source_dirs', 'cache_file', 'local_entry_dir')
+
     source_dirs: List[Path]
     cache_file: Path
     local_entry_dir: Path
@@ -75,58 +109,133 @@ class AppConfig:
             local_entry_dir = DEFAULT_LOCAL_BBS_ENTRY_DIR_PATH,
         )
 
+def _read_small_file(path: Path) -> bytes:
+    # skips the file object's extra fstat()/isatty()
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        chunks = []
+        while True:
+            chunk = os.read(fd, _READ_SIZE)
+            chunks.append(chunk)
+            if len(chunk) < _READ_SIZE:
+                return b''.join(chunks)
+    finally:
+        os.close(fd)
+
 def load_app_config(config_file: Path) -> AppConfig:
     try:
-        with open(config_file, 'r') as file:
-            config_data = yaml.safe_load(file)
-            return AppConfig(**config_data)
+        config_data = yaml.load(_read_small_file(config_file), Loader=_Loader)
+        return AppConfig(**config_data)
     except FileNotFoundError:
         return AppConfig.new()
 
 def save_app_config(config: AppConfig, config_file: Path):
     with open(config_file, 'w') as file:
-        yaml.dump(asdict(config), file)
+        # the safe dumper can't represent Path objects, so store them as strings
+        config_data = {
+            'source_dirs': [ str(p) for p in config.source_dirs ],
+            'cache_file': str(config.cache_file),
+            'local_entry_dir': str(config.local_entry_dir),
+        }
+        yaml.dump(config_data, file, Dumper=_Dumper)
+
+def _iter_yaml_files(root: Path) -> Iterator[Path]:
+    # DirEntry knows the file type, saving rglob's stat() per file
+    stack = [ root ]
+    while stack:
+        try:
+            with os.scandir(stack.pop()) as it:
+                for dir_entry in it:
+                    if dir_entry.is_dir(follow_symlinks=False):
+                        stack.append(dir_entry.path)
+                    elif dir_entry.name.endswith('.yaml') and dir_entry.is_file():
+                        yield Path(dir_entry.path)
+        except OSError:
+            # missing, not a directory, or unreadable; skip it, as rglob did
+            continue
 
 def load_bbs_entries_from_files(paths: List[Path]) -> List[BBSEntry]:
-    entries = []
-    for path in paths:
-        for file_path in path.rglob('*.yaml'):
-            if file_path.is_file():
-                with open(file_path, 'r') as file:
-                    new_entry = BBSEntry.deserialize(yaml.safe_load(file))
-                    entries.append(new_entry)
-    return entries
+    file_paths = [ file_path for path in paths for file_path in _iter_yaml_files(path) ]
+    if not file_paths:
+        return []
+
+    # overlap the I/O; parse in order afterwards
+    with ThreadPoolExecutor(max_workers=min(32, len(file_paths))) as executor:
+        raw_files = list(executor.map(_read_small_file, file_paths))
+
+    return [ BBSEntry.deserialize(yaml.load(data, Loader=_Loader)) for data in raw_files ]
 
 def save_bbs_entry(entry: BBSEntry, app_config: AppConfig):
     entry.source_path.parent.mkdir(parents=True, exist_ok=True)
-    with open(entry.source_path, 'w') as file:
-        yaml.dump(entry.serialize(), file)
+    with open(entry.source_path, 'wb', buffering=_WRITE_BUFFER_SIZE) as file:
+        yaml.dump(entry.serialize(), file, Dumper=_Dumper, encoding='utf-8')
 
 def save_all_bbs_entries(entries: List[BBSEntry], app_config: AppConfig):
     for entry in entries:
         save_bbs_entry(entry, app_config)
 
+def _open_cache_db(cache_file: Path, read_only: bool = False) -> sqlite3.Connection:
+    # one row per entry, so edits don't rewrite the whole cache
+    if read_only:
+        return sqlite3.connect(f'{Path(cache_file).resolve().as_uri()}?mode=ro', uri=True)
+
+    Path(cache_file).parent.mkdir(parents=True, exist_ok=True)
+    db = sqlite3.connect(cache_file)
+    # ids can repeat across source dirs; paths can't
+    db.execute('CREATE TABLE IF NOT EXISTS cached_entries (source_path TEXT PRIMARY KEY, data TEXT NOT NULL)')
+    return db
+
+def _cache_row(entry: BBSEntry) -> Tuple[str, str]:
+    # machine-only data, so compact json rather than yaml
+    return str(entry.source_path), json.dumps(entry.serialize(), separators=(',', ':'))
+
 def save_bbs_entries_to_cache(entries: List[BBSEntry], cache_file: Path):
-    cache_file.parent.mkdir(parents=True, exist_ok=True)
-    with open(cache_file, 'w') as file:
-        yaml.dump([entry.serialize() for entry in entries], file)
+    # start from scratch, which also discards a cache in an older format
+    Path(cache_file).unlink(missing_ok=True)
+    with closing(_open_cache_db(cache_file)) as db, db:
+        db.executemany('INSERT OR REPLACE INTO cached_entries (source_path, data) VALUES (?, ?)', (_cache_row(entry) for entry in entries))
+
+def save_bbs_entry_to_cache(entry: BBSEntry, cache_file: Path):
+    source_path, data = _cache_row(entry)
+    with closing(_open_cache_db(cache_file)) as db, db:
+        # unlike INSERT OR REPLACE, keeps the entry's position
+        if db.execute('UPDATE cached_entries SET data = ? WHERE source_path = ?', (data, source_path)).rowcount == 0:
+            db.execute('INSERT INTO cached_entries (source_path, data) VALUES (?, ?)', (source_path, data))
+
+def delete_bbs_entry_from_cache(entry: BBSEntry, cache_file: Path):
+    with closing(_open_cache_db(cache_file)) as db, db:
+        db.execute('DELETE FROM cached_entries WHERE source_path = ?', (str(entry.source_path),))
 
 def load_bbs_entries_from_cache(cache_file: Path) -> List[BBSEntry]:
     try:
-        with open(cache_file, 'r') as file:
-            return [BBSEntry.deserialize(entry) for entry in yaml.safe_load(file) or []]
-    except FileNotFoundError:
+        with closing(_open_cache_db(cache_file, read_only=True)) as db:
+            # iterate the cursor rather than fetchall()
+            rows = db.execute('SELECT data FROM cached_entries ORDER BY rowid')
+            return [BBSEntry.deserialize(json.loads(data)) for (data,) in rows]
+    except (sqlite3.DatabaseError, ValueError):
+        # missing or in an older format; rebuilt by the caller
         return []
 
+def _mtime_if(path: Path, is_type: Callable[[int], bool]) -> Optional[float]:
+    # one stat() instead of is_file()/is_dir() plus stat()
+    try:
+        st = os.stat(path)
+    except OSError:
+        # as is_file()/is_dir() did for ENOTDIR, ELOOP, etc.
+        return None
+    return st.st_mtime if is_type(st.st_mode) else None
+
 def refresh_bbs_cache(config: AppConfig, existing_bbs_entries: Optional[List[BBSEntry]] = None) -> List[BBSEntry]:
-    if config.cache_file.is_file():
-        cache_mtime = config.cache_file.stat().st_mtime
-        latest_dir_mtime = max((dir_path.stat().st_mtime for dir_path in config.source_dirs if dir_path.is_dir()), default=0)
+    cache_mtime = _mtime_if(config.cache_file, stat.S_ISREG)
+    if cache_mtime is not None:
+        latest_dir_mtime = max((mtime for mtime in (_mtime_if(dir_path, stat.S_ISDIR) for dir_path in config.source_dirs) if mtime is not None), default=0)
         if latest_dir_mtime <= cache_mtime:
             if existing_bbs_entries:
                 return existing_bbs_entries
-            else:
-                return load_bbs_entries_from_cache(config.cache_file)
+
+            cached_bbs_entries = load_bbs_entries_from_cache(config.cache_file)
+            if cached_bbs_entries:
+                return cached_bbs_entries
 
     bbs_entries = load_bbs_entries_from_files(config.source_dirs)
 
@@ -134,34 +243,53 @@ def refresh_bbs_cache(config: AppConfig, existing_bbs_entries: Optional[List[BBS
 
     return bbs_entries
 
-def launch_bbs(entry: BBSEntry):
-    url_parts = urlparse(entry.url)
-
-    if url_parts.scheme == 'telnet':
-        port = str(url_parts.port) if url_parts.port else '23'
-        args = [
-            'telnet',
-            url_parts.hostname,
-            port,
-        ]
-        res = subprocess.run(args)
-        if res.returncode != 0:
-            print(f"ERROR running {args!r}", file=sys.stderr)
-    elif url_parts.scheme == 'ssh':
-        port = str(url_parts.port) if url_parts.port else '22'
-        args = [
-            'ssh',
-            url_parts.hostname,
-            port,
-        ]
-        res = subprocess.run(args)
-        if res.returncode != 0:
-            print(f"ERROR running {args!r}", file=sys.stderr)
-    elif url_parts.scheme == 'https':
-        subprocess.run(['xdg-open', entry.url])
+def _split_url(url: str) -> Tuple[str, str, str]:
+    # (scheme, hostname, port) is all launch_bbs needs, so urlparse is overkill
+    scheme, sep, rest = url.partition('://')
+    if not sep:
+        return '', '', ''
+
+    # the authority ends at the first of path, query or fragment
+    authority = rest
+    for delim in '/?#':
+        authority = authority.partition(delim)[0]
+    hostpart = authority.rpartition('@')[2]
+    if hostpart.startswith('['):
+        # IPv6 literal, e.g. [::1]:23
+        host, _, portpart = hostpart[1:].partition(']')
+        port = portpart[1:] if portpart.startswith(':') else ''
     else:
-        d = dialog.error(f"Unsupported URL scheme: {url_parts.scheme}")
-        d.complete_message()
+        host, sep, port = hostpart.rpartition(':')
+        if not sep:
+            host, port = hostpart, ''
+
+    return scheme.lower(), host, port
+
+_LAUNCHERS: Dict[str, Callable[[str, str, str], List[str]]] = {
+    'telnet': lambda url, hostname, port: [ 'telnet', hostname, port or '23' ],
+    'ssh': lambda url, hostname, port: [ 'ssh', hostname, port or '22' ],
+    'https': lambda url, hostname, port: [ 'xdg-open', url ],
+}
+
+def launch_bbs(entry: BBSEntry):
+    import subprocess
+
+    args = entry._argv
+    if args is None:
+        scheme, hostname, port = _split_url(entry.url)
+
+        build_args = _LAUNCHERS.get(scheme)
+        if build_args is None:
+            import dialog
+            d = dialog.error(f"Unsupported URL scheme: {scheme}")
+            d.complete_message()
+            return
+
+        args = entry._argv = build_args(entry.url, hostname, port)
+
+    res = subprocess.run(args, check=False)
+    if res.returncode != 0:
+        print(f"ERROR running {args!r}", file=sys.stderr)
 
 
 def add_bbs_entry(app_config: AppConfig) -> BBSEntry:
@@ -170,19 +298,23 @@ def add_bbs_entry(app_config: AppConfig) -> BBSEntry:
     return new_entry
 
 def edit_bbs_entry(entry: BBSEntry, app_config: AppConfig):
+    import dialog
+
     d = dialog.Dialog(dialog="dialog")
-    field_choices = [(field.name, str(getattr(entry, field.name))) for field in fields(BBSEntry) if field.name != 'id']
+    field_choices = [(field.name, str(getattr(entry, field.name))) for field in _BBS_FIELDS if field.name != 'id']
     while True:
         code, tag = d.menu("Edit BBS Entry:", choices=field_choices, cancel_label="Back")
         if code == d.OK:
-            field_to_edit = next((field for field in fields(BBSEntry) if field.name == tag), None)
+            field_to_edit = _BBS_FIELD_BY_NAME.get(tag)
             if field_to_edit:
                 field_value = getattr(entry, field_to_edit.name)
                 new_code, new_value = d.inputbox(f"Edit {field_to_edit.name}", init=str(field_value))
                 if new_code == d.OK and new_value != field_value:
                     fieldtype = type(field_value)
                     setattr(entry, field_to_edit.name, fieldtype(new_value))
-                    field_choices = [(field.name, str(getattr(entry, field.name))) for field in fields(BBSEntry)]
+                    if field_to_edit.name == 'url':
+                        entry._argv = None
+                    field_choices = [(field.name, str(getattr(entry, field.name))) for field in _BBS_FIELDS if field.name != 'id']
         else:
             break
 
@@ -192,51 +324,65 @@ def edit_bbs_entry(entry: BBSEntry, app_config: AppConfig):
 def delete_bbs_entry(entry: BBSEntry, bbs_entries: List[BBSEntry], app_config: AppConfig):
     entry.source_path.unlink()
 
+    # by identity: cheaper than list.remove()'s __eq__, and ids can repeat
+    idx = next((i for i, e in enumerate(bbs_entries) if e is entry), None)
+    if idx is not None:
+        del bbs_entries[idx]
+
     if len(bbs_entries) == 0:
         bbs_entries.append(BBSEntry.new(app_config.local_entry_dir))
 
 def generate_choices_from_entries(bbs_entries: List[BBSEntry]) -> List[tuple]:
     return [(entry.name, entry.description) for entry in bbs_entries]
 
-def manage_bbs(app_config: AppConfig, selected_entry: Optional[BBSEntry], bbs_entries: List[BBSEntry]) -> List[BBSEntry]:
+def index_entries_by_name(bbs_entries: List[BBSEntry]) -> Dict[str, BBSEntry]:
+    # reversed, so that the first entry wins when names are duplicated
+    return { entry.name : entry for entry in reversed(bbs_entries) }
+
+def manage_bbs(app_config: AppConfig, selected_entry: Optional[BBSEntry], bbs_entries: List[BBSEntry]) -> Tuple[List[BBSEntry], bool]:
+    import dialog
+
+    # returns (entries, whether they may have changed)
     d = dialog.Dialog(dialog="dialog")
+    entries_dirty = False
 
     if not bbs_entries:
         bbs_entries.append(BBSEntry.new(app_config.local_entry_dir))
+        entries_dirty = True
 
-    choices = [("Add", "Add a new entry")]
+    entry_choices = []
     if selected_entry:
-        choices.extend([
-            ("Launch", f"Connect to {selected_entry.name}"),
-            ("Edit", f"Edit {selected_entry.name}"),
-        ])
-
-    if selected_entry.source_path and selected_entry.source_path.exists():
-        choices.extend([
-            ("Delete", f"Delete {selected_entry.name}"),
-        ])
+        name = selected_entry.name
+        entry_choices = [
+            ("Launch", f"Connect to {name}"),
+            ("Edit", f"Edit {name}"),
+        ]
+        if selected_entry.source_path and selected_entry.source_path.exists():
+            entry_choices.append(("Delete", f"Delete {name}"))
 
-    choices.append(("Refresh Cache", "Reload BBS entries from sources"))
+    choices = [("Add", "Add a new entry"), *entry_choices, ("Refresh Cache", "Reload BBS entries from sources")]
     code, tag = d.menu("Manage BBS Entries:", choices=choices, cancel_label="Back")
     if code == d.OK:
+        entries_dirty = entries_dirty or tag != "Launch"
         if tag == "Launch":
             launch_bbs(selected_entry)
         elif tag == "Add":
             new_entry = add_bbs_entry(app_config)
             bbs_entries.append(new_entry)
+            save_bbs_entry_to_cache(new_entry, app_config.cache_file)
         elif tag == "Edit":
             edit_bbs_entry(selected_entry, app_config)
-            save_bbs_entries_to_cache(bbs_entries, app_config.cache_file)
+            save_bbs_entry_to_cache(selected_entry, app_config.cache_file)
         elif tag == "Delete":
             delete_bbs_entry(selected_entry, bbs_entries, app_config)
-            save_bbs_entries_to_cache(bbs_entries, app_config.cache_file)
+            delete_bbs_entry_from_cache(selected_entry, app_config.cache_file)
             selected_entry = None
         elif tag == "Refresh Cache":
             new_bbs_entries = refresh_bbs_cache(app_config)
             if new_bbs_entries:
                 bbs_entries = new_bbs_entries
 
-    return bbs_entries
+    return bbs_entries, entries_dirty
 
 
 def demo_bbs_entries(app_config) -> List[BBSEntry]:
@@ -244,6 +390,8 @@ def demo_bbs_entries(app_config) -> List[BBSEntry]:
 
 
 def main():
+    import dialog
+
     d = dialog.Dialog(dialog="dialog")
     d.set_background_title("BBS Dialer")
 
@@ -255,14 +403,17 @@ def main():
         save_bbs_entries_to_cache(bbs_entries, app_config.cache_file)
 
     second_pass = False
+    entries_by_name = index_entries_by_name(bbs_entries)
+    choices = generate_choices_from_entries(bbs_entries)
     while True:
-        choices = generate_choices_from_entries(bbs_entries)  # Update choices here
-
         code, tag = d.menu("Choose an action:", choices=choices, ok_label="Select", cancel_label="Exit")
 
         if code == d.OK:
-            selected_entry = next((entry for entry in bbs_entries if entry.name == tag), None)
-            new_bbs_entries = manage_bbs(app_config, selected_entry, bbs_entries)
+            selected_entry = entries_by_name.get(tag)
+            bbs_entries, entries_dirty = manage_bbs(app_config, selected_entry, bbs_entries)
+            if entries_dirty:
+                entries_by_name = index_entries_by_name(bbs_entries)
+                choices = generate_choices_from_entries(bbs_entries)
 
         elif code == d.CANCEL:
             break